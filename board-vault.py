@@ -1,17 +1,82 @@
 import argparse
-import datetime
+import contextlib
 import sqlite3
 import csv
-from rich.console import Console
-from rich.table import Table
 
 
 DB_NAME = "board_vault.db"
+SCHEMA_VERSION = 1
+
+# Lexical 'YYYY-MM-DD HH:MM:SS' pre-filter, cheaper than parsing every imported date.
+# Values that pass must also equal datetime(value, '+0 days'): the modifier makes
+# SQLite normalize the date, so day 31 in short months, Feb 29 outside leap years
+# and hour 24 no longer come back unchanged, and month 13 or minute 60 give NULL
+PLAYED_AT_GLOB = "[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9] [0-9][0-9]:[0-9][0-9]:[0-9][0-9]"
+
+# Star ratings by count (0-10), "⭐" takes two terminal cells
+STARS = ["-"] + ["⭐" * i for i in range(1, 11)]
+STAR_CELLS = [stars.ljust(20 - len(stars) if i else 20) for i, stars in enumerate(STARS)]
+
+# Star ratings (0-10) are normalized against the busiest game in SQL.
+# The scan is served by ux_flow and the 3-month cutoff is computed once per query.
+STATS_QUERY = """
+    WITH s AS (
+        SELECT
+            g.name,
+            COUNT(gf.id) AS total_played,
+            SUM(gf.played_at >= datetime('now', '-3 months')) AS last_3_months_played,
+            MAX(gf.played_at) AS last_played
+        FROM game_flow AS gf
+        JOIN games AS g ON gf.game_id = g.id
+        GROUP BY g.id
+    ),
+    r AS (
+        SELECT
+            name,
+            total_played,
+            last_played,
+            total_played * 10.0 / MAX(total_played) OVER () AS total_ratio,
+            last_3_months_played * 10.0 / MAX(last_3_months_played) OVER () AS recent_ratio
+        FROM s
+    )
+    -- SQLite round() takes halves away from zero, step back on even floors
+    -- to round half to even like Python's round()
+    SELECT
+        name,
+        coalesce(CAST(round(total_ratio) AS INTEGER)
+            - (total_ratio - CAST(total_ratio AS INTEGER) = 0.5 AND CAST(total_ratio AS INTEGER) % 2 = 0), 0),
+        coalesce(CAST(round(recent_ratio) AS INTEGER)
+            - (recent_ratio - CAST(recent_ratio AS INTEGER) = 0.5 AND CAST(recent_ratio AS INTEGER) % 2 = 0), 0),
+        last_played
+    FROM r
+"""
+
+# One fixed statement per sort order, so each is compiled once and cached
+STATS_QUERIES = {
+    "game": STATS_QUERY + "ORDER BY name",
+    "total": STATS_QUERY + "ORDER BY total_played DESC",
+    "last-played": STATS_QUERY + "ORDER BY last_played DESC",
+}
+
+
+def _connect(db_name):
+    """Open a connection in autocommit mode with bulk-friendly PRAGMAs."""
+    conn = sqlite3.connect(db_name, isolation_level=None, cached_statements=256)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-65536")
+    conn.execute("PRAGMA foreign_keys=ON")
+    return conn
+
+
+def init_db(conn):
+    # Schema is already up to date, skip the DDL
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
 
-
-def init_db(db_name):
-    conn = sqlite3.connect(db_name)
     cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
 
     # Create games table
     cursor.execute("""
@@ -23,78 +88,90 @@ def init_db(db_name):
 
     # Create game_flow table
     cursor.execute("""
-        CREATE TABLE IF NOT EXISTS game_flow (
+        CREATE TABLE game_flow_new (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             game_id INTEGER NOT NULL,
-            played_at DATETIME NOT NULL,
-            FOREIGN KEY (game_id) REFERENCES games(id)
+            played_at DATETIME NOT NULL DEFAULT (datetime('now', 'localtime')),
+            FOREIGN KEY (game_id) REFERENCES games(id) ON DELETE CASCADE
         )
     """)
 
-    conn.commit()
-    conn.close()
+    # One play session per game and timestamp, also a covering index for
+    # per-game lookups and the stats GROUP BY game_id. The uniqueness is
+    # intended: it makes re-imports idempotent, so two plays of the same game
+    # within one second are recorded once
+    cursor.execute("DROP INDEX IF EXISTS ux_flow")
+    cursor.execute("""
+        CREATE UNIQUE INDEX ux_flow ON game_flow_new (game_id, played_at)
+    """)
+
+    # Unversioned databases may predate the cascade, the played_at default and
+    # ux_flow, so their play history is copied into the new table
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'game_flow'")
+    if cursor.fetchone() is not None:
+        cursor.execute("""
+            INSERT OR IGNORE INTO game_flow_new (id, game_id, played_at)
+            SELECT id, game_id, replace(played_at, 'T', ' ')
+            FROM game_flow
+            WHERE game_id IN (SELECT id FROM games)
+        """)
+        cursor.execute("DROP TABLE game_flow")
+    cursor.execute("ALTER TABLE game_flow_new RENAME TO game_flow")
+
+    cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    cursor.execute("COMMIT")
+    print("✅ Database initialized.")
 
 
-def list_games(db_name):
-    conn = sqlite3.connect(db_name)
+def list_games(conn):
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT id, name FROM games")
-        games = cursor.fetchall()
+        # Iterate the cursor instead of fetchall() so rows print as they are read
+        cursor.execute("SELECT id, name FROM games ORDER BY name")
+        first = cursor.fetchone()
 
-        if len(games) == 0:
+        if first is None:
             print("🎲 No games found in your game collection.")
         else:
             print("🎲 Your game collection:")
-            for game in games:
-                print(f" {game[0]} - {game[1]}")
+            print(f" {first[0]} - {first[1]}")
+            for game_id, game_name in cursor:
+                print(f" {game_id} - {game_name}")
 
     except sqlite3.Error as e:
         print(f"⚠️ An error occurred: {e}")
-    finally:
-        conn.close()
-
-
-def normalize_to_stars(value, max_value, max_stars=10):
-    """Normalize values to stars based on max_value."""
-    if max_value == 0:  # Avoid division by zero
-        return "-"
-    stars = round((value / max_value) * max_stars)
-    return "⭐" * stars if stars > 0 else "-"
 
 
-def show_stats(db_name, sort_by="game"):
-    conn = sqlite3.connect(db_name)
+def show_stats(conn, sort_by="game", pretty=False):
     cursor = conn.cursor()
 
-    cursor.execute(f'''
-        SELECT 
-            g.name, 
-            COUNT(gf.id) AS total_played, 
-            SUM(CASE 
-                WHEN played_at >= datetime('now', '-3 months') THEN 1 
-                ELSE 0 
-            END) AS last_3_months_played, 
-            MAX(gf.played_at) AS last_played
-        FROM game_flow AS gf
-        LEFT JOIN games AS g ON gf.game_id = g.id
-        GROUP BY game_id
-        ORDER BY 
-            {'g.name' if sort_by == 'game' else ''}
-            {'total_played DESC' if sort_by == 'total' else ''}
-            {'last_played DESC' if sort_by == 'last-played' else ''};
-    ''')
+    cursor.execute(STATS_QUERIES[sort_by])
 
     stats = cursor.fetchall()
-    conn.close()
 
     if not stats:
         print("🎲 No games have been played yet.")
         return
 
-    # Get max values for normalization
-    max_total = max((row[1] for row in stats), default=0)
-    max_recent = max((row[2] for row in stats), default=0)
+    if not pretty:
+        # Plain fixed-width output, much cheaper than laying out a Rich table
+        width = max(len("Game"), *(len(row[0]) for row in stats))
+        # Build the row format once, only the values change per row
+        line = f"{{:<{width}}}  {{}}  {{}}  {{}}"
+        lines = [
+            "🎲 Board Game Stats",
+            line.format("Game", "Total Played".ljust(20), "Last 3 Months".ljust(20), "Last Played"),
+        ]
+        lines += [
+            line.format(name, STAR_CELLS[total], STAR_CELLS[recent], last_played.replace("T", " "))
+            for name, total, recent, last_played in stats
+        ]
+        print("\n".join(lines))
+        return
+
+    # Rich is slow to import, so only load it when a pretty table is requested
+    from rich.console import Console
+    from rich.table import Table
 
     # Create a pretty table
     console = Console()
@@ -107,60 +184,52 @@ def show_stats(db_name, sort_by="game"):
 
     for row in stats:
         game_name = row[0]
-        total_played = normalize_to_stars(row[1], max_total)
-        recent_played = normalize_to_stars(row[2], max_recent)
+        total_played = STARS[row[1]]
+        recent_played = STARS[row[2]]
         last_played = row[3].replace("T", " ") or "Never" # Show date only
         table.add_row(game_name, total_played, recent_played, last_played)
 
     console.print(table)
 
 
-def add_new_game(game_name, db_name):
-    conn = sqlite3.connect(db_name)
+def add_new_game(game_name, conn):
     cursor = conn.cursor()
 
     try:
         cursor.execute("INSERT INTO games (name) VALUES (?)", (game_name,))
-        conn.commit()
         print(f"✅ Game '{game_name}' added successfully.")
     except sqlite3.IntegrityError:
         print(f"⚠️ Game '{game_name}' already exists.")
-    finally:
-        conn.close()
 
 
-def play_game(game_name, db_name):
-    conn = sqlite3.connect(db_name)
+def play_game(game_name, conn):
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT id FROM games WHERE name = ?", (game_name,))
-        game_id = cursor.fetchone()
-        if game_id is None:
-            print(f"⚠️ Game '{game_name}' not found.")
-            return
+        cursor.execute("BEGIN")
 
+        # Unknown games are registered on their first play
         cursor.execute(
-            "INSERT INTO game_flow (game_id, played_at) VALUES (?, ?)",
-            (game_id[0], datetime.datetime.now().replace(microsecond=0).isoformat(sep=" "))
+            "INSERT INTO games (name) VALUES (?) "
+            "ON CONFLICT (name) DO UPDATE SET name = excluded.name RETURNING id",
+            (game_name,)
         )
-        conn.commit()
+        game_id = cursor.fetchone()
+
+        # played_at defaults to the current local time
+        cursor.execute("INSERT INTO game_flow (game_id) VALUES (?)", (game_id[0],))
+        cursor.execute("COMMIT")
         print(f"✅ Game '{game_name}' logged successfully.")
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        print(f"⚠️ Game '{game_name}' was already logged this second.")
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"⚠️ An error occurred: {e}")
-    finally:
-        conn.close()
 
 
-def delete_game(game_name, db_name):
-    conn = sqlite3.connect(db_name)
+def delete_game(game_name, conn):
     cursor = conn.cursor()
     try:
-        cursor.execute("SELECT id FROM games WHERE name = ?", (game_name,))
-        game_id = cursor.fetchone()
-        if game_id is None:
-            print(f"⚠️ Game '{game_name}' not found.")
-            return
-
         confirm = input(
             f"⚠️ Are you sure you want to delete '{game_name}' and all its play history? (y/yes/<Enter>): "
         ).lower()
@@ -168,64 +237,94 @@ def delete_game(game_name, db_name):
             print("❌ Deletion cancelled.")
             return
 
-        cursor.execute("DELETE FROM games WHERE id = ?", (game_id[0],))
-        cursor.execute("DELETE FROM game_flow WHERE game_id = ?", (game_id[0],))
-        conn.commit()
+        # Play history is removed by ON DELETE CASCADE
+        cursor.execute("DELETE FROM games WHERE name = ?", (game_name,))
+        if cursor.rowcount == 0:
+            print(f"⚠️ Game '{game_name}' not found.")
+            return
+
         print(f"✅ Game '{game_name}' deleted successfully.")
     except sqlite3.Error as e:
         print(f"⚠️ An error occurred: {e}")
-    finally:
-        conn.close()
 
 
-def import_games(csv_file, db_name):
-    conn = sqlite3.connect(db_name)
-    cursor = conn.cursor()
-    try:
-        with open(csv_file, "r", encoding="utf-8") as f:
-            reader = csv.reader(f)
-            next(reader, None)  # Skip header if present
+def _stage_csv(conn, csv_file):
+    """Load CSV rows into the temp.stage (name, played_at) table.
+
+    Returns the number of duplicate rows dropped before staging.
+    """
+    conn.execute("CREATE TEMP TABLE stage (name TEXT, played_at TEXT)")
+    with open(csv_file, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # Skip header if present
+
+        # Drop repeats within the file here, INSERT OR IGNORE handles earlier imports
+        seen = set()
+        duplicates = 0
 
+        def unique_sessions():
+            nonlocal duplicates
             for row in reader:
-                game_name, played_at = row[0], row[1]
-
-                try:
-                    played_at = datetime.datetime.strptime(played_at, "%Y-%m-%d %H:%M:%S")
-                except ValueError:
-                    print(f"⚠️ Skipping invalid date format for '{game_name}': {played_at}")
-                    continue  # Skip this row if date is invalid
-
-                cursor.execute("SELECT id FROM games WHERE name = ?", (game_name,))
-                game_id = cursor.fetchone()
-
-                if game_id is None:
-                    # Insert new game
-                    cursor.execute("INSERT INTO games (name) VALUES (?)", (game_name,))
-                    game_id = cursor.lastrowid
-                else:
-                    game_id = game_id[0] 
-
-                # Check if this play session already exists
-                cursor.execute(
-                    "SELECT COUNT(*) FROM game_flow WHERE game_id = ? AND played_at = ?",
-                    (game_id, played_at)
-                )
-                existing_session = cursor.fetchone()[0]
-
-                if existing_session == 0:
-                    cursor.execute(
-                        "INSERT INTO game_flow (game_id, played_at) VALUES (?, ?)",
-                        (game_id, played_at.isoformat()),
-                    )
-                else:
-                    print(f"⚠️ Skipping duplicate session for '{game_name}' at {played_at}")
-
-        conn.commit()
+                session = (row[0], row[1])
+                if session in seen:
+                    duplicates += 1
+                    continue
+                seen.add(session)
+                yield session
+
+        # Rows are streamed from the reader, so only the seen set grows with the file
+        conn.executemany(
+            "INSERT INTO temp.stage (name, played_at) VALUES (?, ?)", unique_sessions()
+        )
+
+    return duplicates
+
+
+def import_games(csv_file, conn):
+    cursor = conn.cursor()
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        duplicates = _stage_csv(conn, csv_file)
+
+        # Drop invalid dates from the stage once, so later statements need no filter
+        cursor.execute("""
+            DELETE FROM temp.stage
+            WHERE played_at NOT GLOB ? OR datetime(played_at, '+0 days') IS NOT played_at
+            RETURNING name, played_at
+        """, (PLAYED_AT_GLOB,))
+        for game_name, played_at in cursor.fetchall():
+            print(f"⚠️ Skipping invalid date format for '{game_name}': {played_at}")
+
+        # Insert new games, already known names are ignored
+        cursor.execute("""
+            INSERT OR IGNORE INTO games (name)
+            SELECT DISTINCT name FROM temp.stage
+        """)
+
+        # Already existing play sessions are ignored by the ux_flow index
+        cursor.execute("""
+            INSERT OR IGNORE INTO game_flow (game_id, played_at)
+            SELECT g.id, s.played_at
+            FROM temp.stage AS s
+            JOIN games AS g ON g.name = s.name
+        """)
+        imported = cursor.rowcount
+
+        cursor.execute("SELECT COUNT(*) FROM temp.stage")
+        skipped = duplicates + cursor.fetchone()[0] - imported
+        if skipped > 0:
+            print(f"⚠️ Skipped {skipped} duplicate session(s).")
+
+        cursor.execute("DROP TABLE temp.stage")
+        cursor.execute("COMMIT")
+
+        # Refresh planner statistics after a bulk load
+        cursor.execute("ANALYZE games")
+        cursor.execute("ANALYZE game_flow")
         print(f"✅ Games imported successfully from '{csv_file}'.")
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"⚠️ An error occurred: {e}")
-    finally:
-        conn.close()
 
 
 def parse_args():
@@ -250,32 +349,37 @@ def parse_args():
     parser.add_argument(
         "--stats", nargs="?", const="game", choices=["game", "total", "last-played"], help="Show game play statistics sorted by (game, total, last-played)"
     )
+    parser.add_argument(
+        "--pretty", action="store_true", help="Render statistics as a Rich table"
+    )
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
 
-    init_db(DB_NAME)
-    print("✅ Database initialized.")
+    with contextlib.closing(_connect(DB_NAME)) as conn:
+        init_db(conn)
+
+        if args.list_games:
+            list_games(conn)
 
-    if args.list_games:
-        list_games(DB_NAME)
+        if args.add_new_game:
+            add_new_game(args.add_new_game, conn)
 
-    if args.add_new_game:
-        add_new_game(args.add_new_game, DB_NAME)
+        if args.play_game:
+            play_game(args.play_game, conn)
 
-    if args.play_game:
-        play_game(args.play_game, DB_NAME)
+        if args.delete_game:
+            delete_game(args.delete_game, conn)
 
-    if args.delete_game:
-        delete_game(args.delete_game, DB_NAME)
+        if args.import_games:
+            import_games(args.import_games, conn)
 
-    if args.import_games:   
-        import_games(args.import_games, DB_NAME)
+        if args.stats:
+            show_stats(conn, args.stats, args.pretty)
 
-    if args.stats:
-        show_stats(DB_NAME, args.stats)
+        conn.execute("PRAGMA optimize")
 
 if __name__ == "__main__":
     main()